@@ -1,14 +1,17 @@
 """FastAPI backend for Commerce Agent with single unified endpoint."""
 
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any, Generator
+from typing import Optional, List, Dict, Any, Generator, Union
+import asyncio
 import logging
 import os
 import json
+import uuid
 from pathlib import Path
 
 from src.config import get_config, setup_logging, reload_config
@@ -51,6 +54,9 @@ class AskRequest(BaseModel):
     image_base64: Optional[str] = None
     conversation_history: Optional[List[Dict[str, str]]] = None
     conversation_context: Optional[Dict[str, Any]] = None
+    # Reserved for server-side reuse of earlier turns; accepted but not read yet
+    previous_response_id: Optional[str] = None
+    context_hash: Optional[str] = None
 
 class AskResponse(BaseModel):
     response: str
@@ -58,6 +64,14 @@ class AskResponse(BaseModel):
     intent: str
     confidence: float
     metadata: Dict[str, Any]
+    response_id: Optional[str] = None
+
+class AskBatchRequest(BaseModel):
+    requests: List[AskRequest]
+
+class AskBatchError(BaseModel):
+    error: str
+    status_code: int
 
 class ReloadResponse(BaseModel):
     status: str
@@ -107,6 +121,23 @@ async def admin_reload():
         logger.error(f"Reload failed: {e}")
         raise HTTPException(status_code=500, detail=f"Reload failed: {str(e)}")
 
+def _degraded_response(request: AskRequest) -> Dict[str, Any]:
+    """Fallback payload served while the agent could not be initialized."""
+    text = (request.text_input or "").strip()
+    if not text and not request.image_base64:
+        raise HTTPException(status_code=400, detail="No input provided")
+    return {
+        "response": "Service running in setup mode. Please complete dependency installation for full features.",
+        "products": [],
+        "intent": "general_chat",
+        "confidence": 0.2,
+        "metadata": {"degraded_mode": True}
+    }
+
+def _with_response_id(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Tag a result with a fresh id the client echoes back as ``previous_response_id``."""
+    return {**result, "response_id": uuid.uuid4().hex}
+
 @app.post("/api/v1/simple-rag/ask", response_model=AskResponse)
 async def ask_agent(request: AskRequest):
     """
@@ -119,17 +150,7 @@ async def ask_agent(request: AskRequest):
     """
     if agent is None:
         # Degraded mode fallback response
-        text = (request.text_input or "").strip()
-        if not text and not request.image_base64:
-            raise HTTPException(status_code=400, detail="No input provided")
-        fallback = {
-            "response": "Service running in setup mode. Please complete dependency installation for full features.",
-            "products": [],
-            "intent": "general_chat",
-            "confidence": 0.2,
-            "metadata": {"degraded_mode": True}
-        }
-        return AskResponse(**fallback)
+        return AskResponse(**_with_response_id(_degraded_response(request)))
     
     try:
         # Process the request using the agentic system with conversation context
@@ -139,12 +160,41 @@ async def ask_agent(request: AskRequest):
             conversation_context=request.conversation_context
         )
         
-        return AskResponse(**result)
+        return AskResponse(**_with_response_id(result))
         
     except Exception as e:
         logger.error(f"Error processing request: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+async def _answer_batch_item(request: AskRequest) -> Union[AskResponse, AskBatchError]:
+    """Answer one batched request off the event loop, reporting failures in place."""
+    try:
+        if agent is None:
+            return AskResponse(**_with_response_id(_degraded_response(request)))
+        result = await run_in_threadpool(
+            agent.process_request,
+            message=request.text_input or "",
+            image_base64=request.image_base64,
+            conversation_context=request.conversation_context
+        )
+        return AskResponse(**_with_response_id(result))
+    except HTTPException as e:
+        return AskBatchError(error=str(e.detail), status_code=e.status_code)
+    except Exception as e:
+        logger.error(f"Error processing batch item: {e}")
+        return AskBatchError(error=f"Internal server error: {str(e)}", status_code=500)
+
+@app.post("/api/v1/simple-rag/ask_batch", response_model=List[Union[AskResponse, AskBatchError]])
+async def ask_agent_batch(batch: AskBatchRequest):
+    """
+    Batched variant of the unified endpoint.
+    
+    Items are answered concurrently in the threadpool and returned in request
+    order; a failing item yields an ``{error, status_code}`` entry instead of
+    failing the whole batch.
+    """
+    return await asyncio.gather(*(_answer_batch_item(request) for request in batch.requests))
+
 @app.post("/api/v1/commerce-agent/ask-stream")
 async def ask_agent_stream(request: AskRequest):
     """
@@ -155,8 +205,8 @@ async def ask_agent_stream(request: AskRequest):
     - Partial responses
     - Final results
     """
-    if agent is None:
-        raise HTTPException(status_code=500, detail="Agent not initialized")
+    # Degraded mode streams the same fallback payload as the non-streaming endpoint
+    fallback = _degraded_response(request) if agent is None else None
     
     def generate_stream() -> Generator[str, None, None]:
         """Generate streaming response."""
@@ -164,12 +214,18 @@ async def ask_agent_stream(request: AskRequest):
             # Send initial status
             yield f"data: {json.dumps({'type': 'status', 'message': 'Processing your request...'})}\n\n"
 
-            # Process the request with streaming
-            for chunk in agent.process_request_stream(
-                message=request.text_input or "",
-                image_base64=request.image_base64
-            ):
-                yield f"data: {json.dumps(chunk)}\n\n"
+            if fallback is not None:
+                yield f"data: {json.dumps({'type': 'response', **_with_response_id(fallback)})}\n\n"
+            else:
+                # Process the request with streaming
+                for chunk in agent.process_request_stream(
+                    message=request.text_input or "",
+                    image_base64=request.image_base64,
+                    conversation_context=request.conversation_context
+                ):
+                    if chunk.get('type') == 'response':
+                        chunk = _with_response_id(chunk)
+                    yield f"data: {json.dumps(chunk)}\n\n"
 
             # Send completion signal
             yield f"data: {json.dumps({'type': 'complete'})}\n\n"
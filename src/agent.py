@@ -219,15 +219,16 @@ class ModularAgenticAgent:
     def _hybrid_search_products(self, query: str, top_k: int) -> List[Dict[str, Any]]:
         """Perform hybrid search using BM25 + Semantic + LLM validation for optimal results."""
         try:
-            # Get all products from catalog for hybrid search
-            all_products = self.catalog.get_all_products()
-            
-            if not all_products:
-                logger.warning("No products available for hybrid search")
-                return []
-            
-            # Hybrid search module not available; use catalog search directly
-            products = self.catalog.search(query, top_k=top_k)
+            # Over-fetch candidates from the vector index, then re-rank them exactly
+            # by cosine similarity with the JIT-compiled kernel
+            candidates = self.catalog.search(query, top_k=top_k * 4)
+            if not candidates or not (query or "").strip():
+                return candidates[:top_k]
+            products = self.catalog.rerank(
+                self.catalog.query_vector(query),
+                [str(p.get('id')) for p in candidates],
+                k=top_k
+            )
             
             logger.info(f"Hybrid search found {len(products)} products for query: '{query}'")
             return products
@@ -706,9 +707,9 @@ Here are some ways I can help:
 
 What would you like to explore today?"""
     
-    def process_request_stream(self, message: str, image_base64: Optional[str] = None) -> Generator[Dict[str, Any], None, None]:
+    def process_request_stream(self, message: str, image_base64: Optional[str] = None, conversation_context: Optional[Dict[str, Any]] = None) -> Generator[Dict[str, Any], None, None]:
         """Process request with streaming (simplified for now)."""
-        result = self.process_request(message, image_base64)
+        result = self.process_request(message, image_base64, conversation_context)
         
         # Yield the result as a single chunk
         yield {
@@ -47,6 +47,9 @@ class DynamicConfig:
     max_retries: int = int(os.getenv("MAX_RETRIES", "3"))
     confidence_threshold: float = float(os.getenv("CONFIDENCE_THRESHOLD", "0.7"))
     conversation_context_limit: int = int(os.getenv("CONVERSATION_CONTEXT_LIMIT", "3"))
+    conversation_history_hard_cap: int = int(os.getenv("CONVERSATION_HISTORY_HARD_CAP", "200"))
+    conversation_recent_budget_chars: int = int(os.getenv("CONVERSATION_RECENT_BUDGET_CHARS", "4000"))
+    recent_turns: int = int(os.getenv("CONVERSATION_RECENT_TURNS", "3"))
     reasoning_enabled: bool = os.getenv("REASONING_ENABLED", "1") == "1"
     tool_calling_enabled: bool = os.getenv("TOOL_CALLING_ENABLED", "1") == "1"
     
@@ -71,6 +74,7 @@ class DynamicConfig:
     enable_product_comparison: bool = os.getenv("ENABLE_PRODUCT_COMPARISON", "1") == "1"
     enable_hybrid_search: bool = os.getenv("ENABLE_HYBRID_SEARCH", "1") == "1"
     enable_streaming: bool = os.getenv("ENABLE_STREAMING", "1") == "1"
+    enable_batching: bool = os.getenv("ENABLE_BATCHING", "0") == "1"
     
     # Dynamic Keyword Lists (comma-separated)
     gym_keywords: str = os.getenv("GYM_KEYWORDS", "gym,workout,fitness,exercise,training,athletic,sports,running,jogging")
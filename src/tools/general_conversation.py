@@ -171,6 +171,9 @@ class GeneralConversationTool:
                         txt = txt[:70] + "…"
                     bullets.append(f"• {intent}: {txt}")
                 summary = "Here’s what you asked recently:\n\n" + "\n".join(bullets)
+                earlier = conversation_context.get("summary")
+                if earlier:
+                    summary += f"\n\nEarlier in this session: {earlier}"
             else:
                 summary = "I don’t have earlier messages yet in this session."
             return {
@@ -31,20 +31,9 @@ class TextProductSearchTool:
         if self._vocab_cache:
             return self._vocab_cache
 
-        all_products = self.catalog.get_all_products()
-        colors, brands, categories = set(), set(), set()
-        for p in all_products:
-            attrs = p.get("attributes", {}) or {}
-            c = attrs.get("color_family")
-            if isinstance(c, str) and c:
-                colors.add(c.strip().lower())
-            b = attrs.get("brand")
-            if isinstance(b, str) and b:
-                brands.add(b.strip().lower())
-            cats = p.get("category") or []
-            for cat in cats if isinstance(cats, list) else [cats]:
-                if isinstance(cat, str) and cat:
-                    categories.add(cat.strip().lower())
+        colors = {c.strip().lower() for c in self.catalog.colors if isinstance(c, str) and c}
+        brands = {b.strip().lower() for b in self.catalog.brands if isinstance(b, str) and b}
+        categories = {c.strip().lower() for c in self.catalog.categories if isinstance(c, str) and c}
 
         self._vocab_cache = {
             "colors": sorted(colors),
@@ -62,9 +51,8 @@ class TextProductSearchTool:
         q_tokens = [t for t in qn.split() if t]
         if not q_tokens:
             return []
-        all_products = self.catalog.get_all_products()
         scored: List[tuple[float, Dict[str, Any]]] = []
-        for p in all_products:
+        for p in self.catalog.iter_all_products():
             name = self._normalize(p.get("name", ""))
             desc = self._normalize(p.get("description", ""))
             text = f"{name} {desc} {self._normalize(p.get('search_text',''))}"
@@ -118,7 +106,16 @@ class TextProductSearchTool:
                         return False
                 return True
 
-            products = [p for p in products if passes(p)][:top_k]
+            products = [p for p in products if passes(p)]
+
+            # Hybrid re-rank: score the over-fetched candidates exactly against the query
+            if products and self.config.enable_hybrid_search and q_lower.strip():
+                products = self.catalog.rerank(
+                    self.catalog.query_vector(query),
+                    [str(p.get('id')) for p in products],
+                    k=top_k
+                )
+            products = products[:top_k]
 
             # Fallback: exact/substring keyword match if semantic returns none
             if not products:
@@ -195,18 +192,7 @@ class TextProductSearchTool:
     def get_product_categories(self) -> List[str]:
         """Get available product categories."""
         try:
-            all_products = self.catalog.get_all_products()
-            categories = set()
-            
-            for product in all_products:
-                product_categories = product.get('category', [])
-                if isinstance(product_categories, list):
-                    categories.update(product_categories)
-                elif isinstance(product_categories, str):
-                    categories.add(product_categories)
-            
-            return sorted(list(categories))
-            
+            return list(self.catalog.categories)
         except Exception as e:
             logger.error(f"Error getting product categories: {e}")
             return []
@@ -214,17 +200,7 @@ class TextProductSearchTool:
     def get_brands(self) -> List[str]:
         """Get available product brands."""
         try:
-            all_products = self.catalog.get_all_products()
-            brands = set()
-            
-            for product in all_products:
-                attributes = product.get('attributes', {})
-                brand = attributes.get('brand', '')
-                if brand:
-                    brands.add(brand)
-            
-            return sorted(list(brands))
-            
+            return list(self.catalog.brands)
         except Exception as e:
             logger.error(f"Error getting brands: {e}")
             return []
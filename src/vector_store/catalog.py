@@ -1,58 +1,313 @@
 """ChromaDB-based product catalog with semantic search."""
 
+import functools
+import glob
+import hashlib
+import itertools
 import json
 import logging
-from typing import List, Dict, Any, Optional
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable, Iterator, Tuple
 import chromadb
 from chromadb.config import Settings
+import numpy as np
+import orjson
+import torch
 from sentence_transformers import SentenceTransformer
 import os
 
+# Optional FAISS index (VECTOR_BACKEND=faiss); Chroma is used when unavailable
+try:
+    import faiss  # type: ignore
+    _HAS_FAISS = True
+except Exception:
+    faiss = None  # type: ignore
+    _HAS_FAISS = False
+
+# Optional Numba JIT for the exact re-rank kernel; NumPy is used otherwise
+try:
+    from numba import njit, prange  # type: ignore
+    _HAS_NUMBA = True
+except Exception:
+    _HAS_NUMBA = False
+
 logger = logging.getLogger(__name__)
 
+CATALOG_PATH = "src/data/catalog.json"
+
+# Stored vectors and queries are unit length, so inner product ranks exactly
+# like cosine without the per-distance norm computation
+HNSW_SPACE = "ip"
+
+# Bump the version whenever the layout of the derived cache changes
+DERIVED_CACHE_FILE = "derived_v2.pkl"
+
+# Where-clause builders for equality filters, keyed by filter name
+_FIELD_BUILDERS: Dict[str, Callable[[Any], Dict[str, Any]]] = {
+    'color_family': lambda v: {'color_family': {'$eq': v}},
+    'brand': lambda v: {'brand': {'$eq': v}},
+    'category': lambda v: {'category': {'$eq': v}},
+    'availability': lambda v: {'availability': {'$eq': v}},
+}
+
+
+def _copy_product(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a product dict together with its nested ``attributes`` (and their lists) and ``category``."""
+    copied = dict(product)
+    if isinstance(copied.get('attributes'), dict):
+        copied['attributes'] = {
+            k: list(v) if isinstance(v, list) else v for k, v in copied['attributes'].items()
+        }
+    if isinstance(copied.get('category'), list):
+        copied['category'] = list(copied['category'])
+    return copied
+
+
+def _price_builder(keys: frozenset) -> Optional[Callable[[Dict[str, Any]], Dict[str, Any]]]:
+    """Where-clause builder for the (possibly composite) price range in ``keys``."""
+    has_min = 'price_min' in keys
+    has_max = 'price_max' in keys
+    if has_min and has_max:
+        return lambda f: {
+            '$and': [
+                {'price': {'$gte': f['price_min']}},
+                {'price': {'$lte': f['price_max']}}
+            ]
+        }
+    if has_max:
+        return lambda f: {'price': {'$lte': f['price_max']}}
+    if has_min:
+        return lambda f: {'price': {'$gte': f['price_min']}}
+    return None
+
+
+# Every filter key _build_filters understands, in where-clause order
+_FILTER_KEYS = ('price_min', 'price_max', 'color_family', 'brand', 'category', 'availability')
+
+
+def _make_filter_factory(keys: frozenset) -> Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Specialize where-clause construction for one fixed set of filter keys."""
+    price = _price_builder(keys)
+    parts = [price] if price is not None else []
+    parts += [
+        (lambda f, key=key, build=_FIELD_BUILDERS[key]: build(f[key]))
+        for key in _FILTER_KEYS if key in _FIELD_BUILDERS and key in keys
+    ]
+
+    if not parts:
+        return lambda f: None
+    if len(parts) == 1:
+        return parts[0]
+    return lambda f: {'$and': [part(f) for part in parts]}
+
+
+# One factory per subset of _FILTER_KEYS (2^6 entries), keyed by the set of filter names
+_FILTER_FACTORIES: Dict[frozenset, Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = {
+    frozenset(combo): _make_filter_factory(frozenset(combo))
+    for r in range(len(_FILTER_KEYS) + 1)
+    for combo in itertools.combinations(_FILTER_KEYS, r)
+}
+
+
+if _HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cosine_scores(mat, q):
+        """Dot product of every row of ``mat`` with unit vector ``q``."""
+        n = mat.shape[0]
+        scores = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            acc = np.float32(0.0)
+            for j in range(mat.shape[1]):
+                acc += mat[i, j] * q[j]
+            scores[i] = acc
+        return scores
+else:
+    def _cosine_scores(mat, q):
+        """Dot product of every row of ``mat`` with unit vector ``q``."""
+        return mat @ q
+
+
+def _cosine_topk(mat, q, k):
+    """Top-k rows of ``mat`` by dot product with unit vector ``q``, best first."""
+    scores = _cosine_scores(mat, q)
+    # Numba has no argpartition, so selection runs in NumPy: O(n) plus a k-sized sort
+    top = np.argpartition(-scores, k - 1)[:k]
+    order = top[np.argsort(-scores[top])]
+    return order, scores[order]
+
+
+# Process-wide singletons: every CatalogStore shares one model and one client
+_singleton_lock = threading.Lock()
+
+
+def _reduced_precision_dtype(precision: str):
+    """Pick a half-precision dtype the CPU can run fast, or None to stay FP32.
+
+    The embedder always runs on CPU, so only native AVX512-BF16 qualifies;
+    FP16 lacks most CPU kernels and is never selected.
+    """
+    if precision in ("bf16", "auto"):
+        cpu_bf16 = getattr(getattr(torch, "cpu", None), "_is_avx512_bf16_supported", None)
+        if cpu_bf16 is not None and cpu_bf16():
+            return torch.bfloat16
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _load_embedder(name: str, backend: str, onnx_file: str) -> SentenceTransformer:
+    # Intra-op threads default to half the cores; one inter-op thread is enough
+    # for a single sequential forward pass
+    torch.set_num_threads(int(os.getenv("TORCH_NUM_THREADS") or max(1, (os.cpu_count() or 2) // 2)))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only settable before the first parallel op in the process
+        pass
+    if backend == "onnx":
+        return SentenceTransformer(
+            name,
+            device="cpu",
+            backend="onnx",
+            model_kwargs={"file_name": onnx_file} if onnx_file else None
+        )
+    model = SentenceTransformer(name, device="cpu")
+
+    # EMBEDDING_PRECISION=bf16|fp16|auto casts the weights when the hardware supports it
+    precision = os.getenv("EMBEDDING_PRECISION", "fp32").lower()
+    dtype = _reduced_precision_dtype(precision) if precision != "fp32" else None
+    if dtype is not None:
+        model = model.to(dtype)
+        logger.info(f"Embedding model cast to {dtype}")
+    elif precision != "fp32":
+        logger.info(f"EMBEDDING_PRECISION={precision} not supported on this host; staying on FP32")
+
+    # EMBEDDING_COMPILE=1 captures the transformer graph with torch.compile (torch >= 2.0)
+    if os.getenv("EMBEDDING_COMPILE", "0").lower() in ["1", "true", "yes"] and hasattr(torch, "compile"):
+        model[0].auto_model = torch.compile(model[0].auto_model, mode="reduce-overhead")
+        logger.info("Embedding model wrapped with torch.compile")
+    return model
+
+
+def _get_embedder(name: str, backend: str = "torch", onnx_file: str = "") -> SentenceTransformer:
+    """Return the shared SentenceTransformer for this model/backend, loading it once."""
+    with _singleton_lock:
+        return _load_embedder(name, backend, onnx_file)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_chroma_client(persist_dir: Optional[str]):
+    settings = Settings(
+        anonymized_telemetry=False,
+        allow_reset=True
+    )
+    if persist_dir is None:
+        # In-memory client: no sqlite file and nothing written to disk
+        return chromadb.EphemeralClient(settings=settings)
+    return chromadb.PersistentClient(path=persist_dir, settings=settings)
+
+
+def _get_chroma_client(persist_dir: Optional[str]):
+    """Return the shared Chroma client for ``persist_dir`` (in-memory if None), creating it once."""
+    with _singleton_lock:
+        return _load_chroma_client(persist_dir)
+
+
 class CatalogStore:
     """Product catalog using ChromaDB for vector storage and semantic search."""
     
-    def __init__(self, persist_dir: str = "./chroma_db", embedding_model: str = None):
-        # Resolve configuration from environment with sensible defaults
-        persist_dir = os.getenv("CHROMA_PERSIST_DIR", persist_dir)
+    def __init__(self, persist_dir: Optional[str] = "./chroma_db", embedding_model: str = None):
+        # Resolve configuration from environment with sensible defaults;
+        # persist_dir=None or CHROMA_EPHEMERAL=1 keeps everything in memory
+        if persist_dir is not None:
+            persist_dir = os.getenv("CHROMA_PERSIST_DIR", persist_dir)
+        if os.getenv("CHROMA_EPHEMERAL", "0").lower() in ["1", "true", "yes"]:
+            persist_dir = None
+        self._persist_dir = persist_dir
+        self._base_url = os.getenv("PRODUCT_BASE_URL", "https://example.com/products/")
         embedding_model = embedding_model or os.getenv("EMBEDDING_MODEL", "BAAI/bge-base-en")
+        self._embedding_model_name = embedding_model
 
         # Prefer CPU to reduce RAM/GPU pressure
         os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
         os.environ.setdefault("PYTORCH_MPS_HIGH_WATERMARK_RATIO", "0.0")
         os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
-        os.environ.setdefault("OMP_NUM_THREADS", "1")
-        os.environ.setdefault("MKL_NUM_THREADS", "1")
 
-        # Initialize embedding model
-        self.embedding_model = SentenceTransformer(embedding_model, device="cpu")
-        logger.info(f"Loaded embedding model: {embedding_model}")
+        # Initialize embedding model (EMBEDDING_BACKEND=onnx runs it on ONNX Runtime)
+        backend = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+        self.embedding_model = _get_embedder(
+            embedding_model,
+            backend,
+            os.getenv("EMBEDDING_ONNX_FILE", "") if backend == "onnx" else ""
+        )
+        logger.info(f"Loaded embedding model: {embedding_model} ({backend} backend)")
+
+        self._embedding_dim = self.embedding_model.get_sentence_embedding_dimension()
+
+        # Query-embedding LRU and TTL-bounded result LRU (ENABLE_CACHING / CACHE_TTL)
+        self._cache_enabled = os.getenv("ENABLE_CACHING", "1") == "1"
+        self._cache_ttl = float(os.getenv("CACHE_TTL", "3600"))
+        self._result_cache_size = int(os.getenv("SEARCH_RESULT_CACHE_SIZE", "1024"))
+        self._emb_cache = functools.lru_cache(maxsize=2048)(self._encode_uncached)
+        self._result_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._result_cache_lock = threading.Lock()
         
         # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(
-            path=persist_dir,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
+        self.client = _get_chroma_client(persist_dir)
         
         # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name="products",
-            metadata={"hnsw:space": "cosine"}
-        )
+        self.collection = self._open_collection("products")
         
         # Load catalog data
+        self._products_by_id: Dict[str, Dict[str, Any]] = {}
+        self._all_products_cache: Optional[List[Dict[str, Any]]] = None
         self._load_catalog()
+
+        # Distinct attribute values (categories, brands, colors), cached on disk
+        self._load_or_build_derived()
+
+        # Optional FAISS HNSW index over the stored vectors
+        self._faiss_index = None
+        use_faiss = os.getenv("VECTOR_BACKEND", "chroma").lower() == "faiss"
+        if use_faiss and not _HAS_FAISS:
+            logger.warning("VECTOR_BACKEND=faiss but faiss is not installed; using Chroma")
+            use_faiss = False
+
+        # Row-aligned metadata, filter columns and unit-norm embedding matrix
+        self._load_rows()
+        self._emb_matrix = self._load_embedding_matrix()
+
+        # Tiny catalogs: one exact matmul beats any ANN traversal
+        self._use_bruteforce = len(self._rows) < int(os.getenv("BRUTEFORCE_MAX_PRODUCTS", "1000"))
+        if use_faiss and self._use_bruteforce:
+            logger.info(f"VECTOR_BACKEND=faiss ignored: {len(self._rows)} products are below BRUTEFORCE_MAX_PRODUCTS")
+        elif use_faiss:
+            self._build_faiss_index(self._emb_matrix)
+
+        # Pay kernel selection / graph capture now instead of on the first search
+        self._warmup_encoder()
+
+        # Pre-embed the most common queries so their first search is warm
+        warmup_queries = [q for q in os.getenv("SEARCH_WARMUP_QUERIES", "").split(",") if q.strip()]
+        if warmup_queries:
+            self.warmup(warmup_queries)
         
         logger.info("Catalog initialized with 20 products")
     
     def _load_catalog(self):
         """Load product catalog from JSON file."""
+        self._all_products_cache = None
         try:
-            catalog_path = "src/data/catalog.json"
+            catalog_path = CATALOG_PATH
+
+            # Load catalog data; decoded records back _metadata_to_product
+            with open(catalog_path, 'rb') as f:
+                catalog_bytes = f.read()
+            products = orjson.loads(catalog_bytes)
+            self._products_by_id = {str(p['id']): p for p in products}
+            self._catalog_hash = hashlib.blake2b(catalog_bytes, digest_size=16).hexdigest()
             
             # If collection already has data and not forcing reload, skip loading
             try:
@@ -61,53 +316,71 @@ class CatalogStore:
                 existing_count = 0
 
             force_reload = os.getenv("CHROMA_FORCE_RELOAD", "0").lower() in ["1", "true", "yes"]
-            if existing_count > 0 and not force_reload:
-                logger.info(f"Chroma collection already has {existing_count} items. Skipping catalog reload.")
+            signature = {
+                "catalog_hash": self._catalog_hash,
+                "embedding_model": self._embedding_model_name,
+                "index_space": HNSW_SPACE,
+            }
+            stored = self.collection.metadata or {}
+            if existing_count > 0 and not force_reload and all(stored.get(k) == v for k, v in signature.items()):
+                logger.info(f"Chroma collection already has {existing_count} items for this catalog. Skipping catalog reload.")
                 return
 
-            # Load catalog data
-            with open(catalog_path, 'r') as f:
-                products = json.load(f)
-            
             logger.info(f"Loading {len(products)} products from catalog")
+
+            # The HNSW graph has a fixed dimension and distance function; only a
+            # forced reload, a different output size or space needs a fresh collection
+            needs_reset = (
+                force_reload
+                or stored.get("index_space") != HNSW_SPACE
+                or self._stored_embedding_dim() != self._embedding_dim
+            )
+            if existing_count > 0 and needs_reset:
+                try:
+                    name = self.collection.name
+                    self.client.delete_collection(name)
+                    self.collection = self._open_collection(name)
+                except Exception:
+                    # Fallback: ignore if cannot delete
+                    pass
             
-            try:
-                # Safer reset: delete collection then recreate to avoid filter issues
-                name = self.collection.name
-                self.client.delete_collection(name)
-                self.collection = self.client.get_or_create_collection(
-                    name=name,
-                    metadata={"hnsw:space": "cosine"}
-                )
-            except Exception:
-                # Fallback: ignore if cannot delete
-                pass
-            
-            # Prepare data for ChromaDB
-            documents = []
-            metadatas = []
-            ids = []
+            # Prepare data for ChromaDB in one pass over pre-sized lists
+            n = len(products)
+            documents: List[str] = [""] * n
+            metadatas: List[Dict[str, Any]] = [{}] * n
+            ids: List[str] = [""] * n
             
-            for product in products:
+            for i, product in enumerate(products):
                 # Use search_text as document
-                documents.append(product['search_text'])
+                documents[i] = product['search_text']
                 
                 # Create metadata (all other fields)
-                metadata = self._create_metadata(product)
-                metadatas.append(metadata)
+                metadatas[i] = self._create_metadata(product)
                 
                 # Use product ID as string (Chroma expects string IDs)
                 try:
-                    ids.append(str(product['id']))
+                    ids[i] = str(product['id'])
                 except Exception:
-                    ids.append(str(product.get('id', '')))  # ensure string
+                    ids[i] = str(product.get('id', ''))  # ensure string
             
-            # Add to ChromaDB
-            self.collection.add(
+            # Embed with the same model used for queries
+            embeddings = self._encode_documents(documents)
+
+            # Overwrite by id in one batch, then drop products no longer in the catalog
+            self.collection.upsert(
+                embeddings=embeddings.tolist(),
                 documents=documents,
                 metadatas=metadatas,
                 ids=ids
             )
+            stale_ids = set(self.collection.get(include=[])['ids']) - set(ids)
+            if stale_ids:
+                self.collection.delete(ids=list(stale_ids))
+
+            # Record what the vectors were built from; hnsw:* keys cannot be modified
+            metadata = {k: v for k, v in (self.collection.metadata or {}).items() if not k.startswith("hnsw:")}
+            metadata.update(signature)
+            self.collection.modify(metadata=metadata)
             
             logger.info("Successfully loaded products with embeddings")
             
@@ -115,31 +388,309 @@ class CatalogStore:
             logger.error(f"Failed to load catalog: {e}")
             raise e
     
+    def _encode_documents(self, documents: List[str]) -> np.ndarray:
+        """Embed documents as unit vectors.
+
+        ``SentenceTransformer.encode`` already batches inputs by length and
+        restores the original order, so no pre-sorting is needed here.
+        """
+        with torch.inference_mode():
+            return self.embedding_model.encode(
+                documents,
+                batch_size=32,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+
+    def _open_collection(self, name: str):
+        """Open a collection without rewriting its stored metadata.
+
+        get_or_create_collection replaces differing metadata, which would drop
+        the catalog signature recorded after indexing.
+        """
+        try:
+            return self.client.get_collection(name)
+        except Exception:
+            return self.client.create_collection(name=name, metadata={"hnsw:space": HNSW_SPACE})
+
+    def _stored_embedding_dim(self) -> Optional[int]:
+        """Dimension of the vectors already persisted in the collection, if any."""
+        try:
+            sample = self.collection.get(limit=1, include=["embeddings"])
+            embeddings = sample.get('embeddings')
+            if embeddings is not None and len(embeddings):
+                return len(embeddings[0])
+        except Exception:
+            pass
+        return None
+
+    def _cache_path(self, filename: str) -> Optional[str]:
+        """Path for a derived file next to the Chroma data, or None when running in memory."""
+        if self._persist_dir is None:
+            return None
+        return os.path.join(self._persist_dir, filename)
+
+    def _remove_stale_files(self, pattern: str, keep: set):
+        """Delete derived files matching ``pattern`` that earlier catalogs or models left behind."""
+        if self._persist_dir is None:
+            return
+        for path in glob.glob(os.path.join(self._persist_dir, pattern)):
+            if path in keep:
+                continue
+            try:
+                os.remove(path)
+                logger.info(f"Removed stale derived file {path}")
+            except OSError as e:
+                logger.warning(f"Could not remove stale derived file {path}: {e}")
+
+    def _derived_cache_key(self) -> str:
+        """Fingerprint of the catalog file and collection size the derived data was built from."""
+        return f"{self._catalog_hash}:{self.collection.count()}"
+
+    def _load_or_build_derived(self):
+        """Restore derived lookup structures from disk, rebuilding them if the catalog changed."""
+        derived_path = self._cache_path(DERIVED_CACHE_FILE)
+        if derived_path is None:
+            self._rebuild_attribute_indexes()
+            return
+        try:
+            key = self._derived_cache_key()
+        except Exception as e:
+            logger.warning(f"Cannot fingerprint catalog, rebuilding derived data: {e}")
+            self._rebuild_attribute_indexes()
+            return
+
+        try:
+            with open(derived_path, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get('key') == key:
+                self._set_attribute_indexes(cached['categories'], cached['brands'], cached['colors'])
+                logger.info(f"Loaded derived catalog data from {derived_path}")
+                return
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable derived cache {derived_path}: {e}")
+
+        self._rebuild_attribute_indexes()
+        try:
+            with open(derived_path, 'wb') as f:
+                pickle.dump({
+                    'key': key,
+                    'categories': self._category_set,
+                    'brands': self._brand_set,
+                    'colors': self._color_set,
+                }, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._remove_stale_files("derived_*.pkl", {derived_path})
+        except Exception as e:
+            logger.warning(f"Failed to write derived cache {derived_path}: {e}")
+
+    def _load_rows(self, include_embeddings: bool = False) -> Dict[str, Any]:
+        """Snapshot the collection into row-aligned structures.
+
+        ``_rows`` holds (metadata, document) pairs and the filterable fields are
+        kept as NumPy columns (structure of arrays) so filters evaluate as a
+        handful of vectorized comparisons. Returns the raw ``collection.get``
+        result so callers can reuse the embeddings.
+        """
+        include = ["metadatas", "documents"] + (["embeddings"] if include_embeddings else [])
+        results = self.collection.get(include=include)
+        metadatas = results['metadatas'] or []
+        documents = results['documents'] or [""] * len(metadatas)
+
+        self._row_ids = list(results['ids'])
+        self._row_index = {row_id: i for i, row_id in enumerate(self._row_ids)}
+        # Rows come back in Chroma's id order; keep a permutation into catalog file order
+        position = {product_id: i for i, product_id in enumerate(self._products_by_id)}
+        self._catalog_order = np.array(
+            sorted(range(len(self._row_ids)), key=lambda r: position.get(self._row_ids[r], len(position))),
+            dtype=np.int64
+        )
+        self._rows = list(zip(metadatas, documents))
+        self._prices = np.array([m.get('price', 0) for m in metadatas], dtype=np.float64)
+        self._availability = np.array([bool(m.get('availability', True)) for m in metadatas], dtype=bool)
+        self._filter_columns = {
+            key: np.array([m.get(key, '') for m in metadatas], dtype=object)
+            for key in ('color_family', 'brand', 'category')
+        }
+        self._filter_columns['availability'] = self._availability
+        return results
+
+    def _load_embedding_matrix(self) -> np.ndarray:
+        """Unit-norm embedding matrix aligned with ``_rows``, memory-mapped from disk.
+
+        The matrix and its row ids are saved as .npy files keyed by catalog and
+        model; every worker maps the same file read-only, so the pages are shared
+        through the OS page cache instead of copied into each process.
+        """
+        key = hashlib.sha256(f"{self._derived_cache_key()}:{self._embedding_model_name}".encode()).hexdigest()[:12]
+        emb_path = self._cache_path(f"emb_{key}.npy")
+        ids_path = self._cache_path(f"emb_ids_{key}.npy")
+        if emb_path is not None:
+            try:
+                stored_ids = np.load(ids_path)
+                if stored_ids.tolist() == self._row_ids:
+                    logger.info(f"Memory-mapped embedding matrix from {emb_path}")
+                    self._remove_stale_files("emb_*.npy", {emb_path, ids_path})
+                    return np.load(emb_path, mmap_mode="r")
+            except (FileNotFoundError, ValueError, OSError):
+                pass
+
+        # Re-snapshot with embeddings so rows and vectors come from one read
+        rows = self._load_rows(include_embeddings=True)
+        matrix = np.ascontiguousarray(np.asarray(rows['embeddings'], dtype=np.float32))
+        if not len(matrix):
+            return matrix
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        if emb_path is None:
+            return matrix
+        try:
+            # Write-then-rename so concurrently starting workers never map a partial file
+            for path, array in ((emb_path, matrix), (ids_path, np.array(self._row_ids))):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, array)
+                os.replace(tmp_path, path)
+            self._remove_stale_files("emb_*.npy", {emb_path, ids_path})
+            return np.load(emb_path, mmap_mode="r")
+        except Exception as e:
+            logger.warning(f"Could not persist embedding matrix, keeping it in memory: {e}")
+            return matrix
+
+    def _build_numpy_mask(self, filters: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Boolean row mask for the same filters ``_build_filters`` understands."""
+        mask = np.ones(len(self._rows), dtype=bool)
+        if not filters:
+            return mask
+        if 'price_min' in filters:
+            mask &= self._prices >= filters['price_min']
+        if 'price_max' in filters:
+            mask &= self._prices <= filters['price_max']
+        for key, column in self._filter_columns.items():
+            if key in filters:
+                mask &= column == filters[key]
+        return mask
+
+    def _build_faiss_index(self, embeddings):
+        """Load or build an HNSW inner-product index over the collection's vectors.
+
+        FAISS ids are row positions into ``_rows``, so the filter mask and the
+        (metadata, document) pairs can be indexed directly by search results.
+        """
+
+        num_threads = os.getenv("FAISS_NUM_THREADS")
+        if num_threads:
+            faiss.omp_set_num_threads(int(num_threads))
+
+        # VECTOR_QUANTIZATION=int8 stores 8-bit codes and re-ranks with FP32 vectors
+        quantize = os.getenv("VECTOR_QUANTIZATION", "none").lower() == "int8"
+        key = hashlib.sha256(f"{self._derived_cache_key()}:{self._embedding_model_name}".encode()).hexdigest()[:12]
+        kind = "hnsw_sq8" if quantize else "hnsw"
+        index_path = self._cache_path(f"faiss_{kind}_{key}.index")
+        if index_path is not None and os.path.exists(index_path):
+            index = faiss.read_index(index_path)
+            if index.ntotal == len(self._rows):
+                self._faiss_index = index
+                logger.info(f"Loaded FAISS index from {index_path}")
+                self._remove_stale_files("faiss_*.index", {index_path})
+                return
+
+        vecs = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+        dim = vecs.shape[1]
+        if quantize:
+            # Per-dimension 8-bit scalar quantizer; IndexRefineFlat re-scores
+            # 2 * top_k candidates with the FP32 query against FP32 vectors
+            base = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT)
+            refine = faiss.IndexRefineFlat(base)
+            refine.k_factor = 2
+            index = faiss.IndexIDMap2(refine)
+            index.train(vecs)
+        else:
+            index = faiss.IndexIDMap2(faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT))
+        index.add_with_ids(vecs, np.arange(len(vecs), dtype=np.int64))
+        if index_path is not None:
+            try:
+                faiss.write_index(index, index_path)
+                self._remove_stale_files("faiss_*.index", {index_path})
+            except Exception as e:
+                logger.warning(f"Failed to persist FAISS index {index_path}: {e}")
+        self._faiss_index = index
+        logger.info(f"Built FAISS {kind} index with {index.ntotal} vectors")
+
+    def _rebuild_attribute_indexes(self):
+        """Collect distinct categories, brands and colors in a single catalog scan.
+
+        Reads the decoded catalog records rather than Chroma metadata, which only
+        stores each product's first category.
+        """
+        categories, brands, colors = set(), set(), set()
+        for product in self._products_by_id.values():
+            product_categories = product.get('category') or []
+            if isinstance(product_categories, str):
+                product_categories = [product_categories]
+            categories.update(c for c in product_categories if c)
+            attrs = product.get('attributes') or {}
+            if attrs.get('brand'):
+                brands.add(attrs['brand'])
+            if attrs.get('color_family'):
+                colors.add(attrs['color_family'])
+
+        self._set_attribute_indexes(categories, brands, colors)
+
+    def _set_attribute_indexes(self, categories: set, brands: set, colors: set):
+        self._category_set = categories
+        self._brand_set = brands
+        self._color_set = colors
+        self._categories = tuple(sorted(categories))
+        self._brands = tuple(sorted(brands))
+        self._colors = tuple(sorted(colors))
+
+    @property
+    def categories(self) -> Tuple[str, ...]:
+        """Distinct product categories (every category of every product), sorted."""
+        return self._categories
+
+    @property
+    def brands(self) -> Tuple[str, ...]:
+        """Distinct product brands, sorted."""
+        return self._brands
+
+    @property
+    def colors(self) -> Tuple[str, ...]:
+        """Distinct product color families, sorted."""
+        return self._colors
+    
     def _create_metadata(self, product: Dict[str, Any]) -> Dict[str, Any]:
         """Create metadata dictionary for ChromaDB.
         Adds stable fields including a product URL. If no URL provided in the
         source JSON, constructs one from PRODUCT_BASE_URL and product id.
         """
-        base_url = os.getenv("PRODUCT_BASE_URL", "https://example.com/products/")
-        product_url = product.get("url") or f"{base_url}{product['id']}"
-
-        metadata = {
+        attrs = product['attributes']
+        return {
             'id': product['id'],
             'name': product['name'],
             'description': product['description'],
             'price': product['price'],
             'availability': product['availability'],
-            'brand': product['attributes'].get('brand', ''),
-            'color_family': product['attributes'].get('color_family', ''),
-            'material': product['attributes'].get('material', ''),
+            'brand': attrs.get('brand', ''),
+            'color_family': attrs.get('color_family', ''),
+            'material': attrs.get('material', ''),
             'category': product['category'][0] if product['category'] else '',  # Use first category
-            'size': json.dumps(product['attributes'].get('size', [])),  # Store as JSON string
-            'url': product_url
+            'size': "|".join(str(s) for s in attrs.get('size', [])),  # Store as "S|M|L"
+            'url': product.get("url") or f"{self._base_url}{product['id']}"
         }
-        return metadata
     
     def _metadata_to_product(self, metadata: Dict[str, Any], document: str) -> Dict[str, Any]:
         """Convert ChromaDB metadata back to product dictionary."""
+        # Reuse the decoded catalog record when we have it; no per-row parsing
+        cached = self._products_by_id.get(str(metadata.get('id', '')))
+        if cached is not None:
+            product = _copy_product(cached)
+            product['search_text'] = document
+            product['url'] = metadata.get('url', '')
+            return product
+
         product = {
             'id': metadata.get('id', ''),
             'name': metadata.get('name', ''),
@@ -151,34 +702,184 @@ class CatalogStore:
                 'brand': metadata.get('brand', ''),
                 'color_family': metadata.get('color_family', ''),
                 'material': metadata.get('material', ''),
-                'size': json.loads(metadata.get('size', '[]'))
+                'size': self._parse_size(metadata.get('size', ''))
             },
             'search_text': document,
             'url': metadata.get('url', '')
         }
         return product
     
-    def search(self, query: str, top_k: int = 3, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        """Search products using semantic similarity with optional metadata filtering."""
+    @staticmethod
+    def _parse_size(value: str) -> List[str]:
+        """Split a "|"-joined size string; collections written before the switch hold JSON."""
+        if not value:
+            return []
+        if value.startswith('['):
+            return json.loads(value)
+        return value.split('|')
+    
+    def _encode_query(self, query: str) -> np.ndarray:
+        """Encode a single query into a fresh unit-norm ``(1, dim)`` array.
+
+        Searches run concurrently from the server's threadpool, so each call
+        gets its own output array rather than sharing a buffer.
+        """
+        features = self.embedding_model.tokenize([query])
+        features = {k: v.to(self.embedding_model.device) for k, v in features.items()}
+        with torch.inference_mode():
+            out = self.embedding_model.forward(features)['sentence_embedding']
+        vec = out.float().cpu().numpy()
+        vec /= np.linalg.norm(vec, axis=1, keepdims=True)
+        return vec
+    
+    def _encode_uncached(self, query_norm: str) -> List[float]:
+        """Embed a normalized query; wrapped by the ``_emb_cache`` LRU."""
+        return self._encode_query(query_norm)[0].tolist()
+
+    def _warmup_encoder(self):
+        """Run the query and document encode paths and the re-rank kernel once."""
         try:
-            # Build where clause for metadata filtering
-            where_clause = self._build_filters(filters) if filters else None
-            
-            # Perform search
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=top_k,
-                where=where_clause
-            )
-            
-            # Convert results to product format
+            with torch.inference_mode():
+                self.embedding_model.encode(["warmup"] * 4, batch_size=4, show_progress_bar=False)
+            query_vec = self._encode_query("warmup")
+            if len(self._emb_matrix):
+                _cosine_topk(self._emb_matrix, query_vec[0], 1)
+        except Exception as e:
+            logger.warning(f"Embedder warmup failed: {e}")
+
+    def warmup(self, queries: List[str]):
+        """Populate the query-embedding cache for the given queries."""
+        for query in queries:
+            self._emb_cache(query.strip().lower())
+        logger.info(f"Warmed embedding cache with {len(queries)} queries")
+
+    def _cached_result(self, key: tuple) -> Optional[List[Dict[str, Any]]]:
+        """Copies of the cached products for ``key``, or None if absent or expired."""
+        with self._result_cache_lock:
+            entry = self._result_cache.get(key)
+            if entry is None:
+                return None
+            stored_at, products = entry
+            if time.monotonic() - stored_at > self._cache_ttl:
+                del self._result_cache[key]
+                return None
+            self._result_cache.move_to_end(key)
+        # Callers may mutate what they get back; keep the cached dicts pristine
+        return [_copy_product(p) for p in products]
+
+    def _store_result(self, key: tuple, products: List[Dict[str, Any]]):
+        entry = (time.monotonic(), tuple(_copy_product(p) for p in products))
+        with self._result_cache_lock:
+            self._result_cache[key] = entry
+            self._result_cache.move_to_end(key)
+            while len(self._result_cache) > self._result_cache_size:
+                self._result_cache.popitem(last=False)
+    
+    def _chroma_search(self, query_embeddings: List[List[float]], top_k: int, filters: Optional[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        # Build where clause for metadata filtering
+        where_clause = self._build_filters(filters) if filters else None
+        
+        # Perform search
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=top_k,
+            where=where_clause
+        )
+        
+        # Convert results to product format, one list per query
+        batches = []
+        for q in range(len(query_embeddings)):
             products = []
-            if results['documents'] and results['documents'][0]:
-                for i, doc in enumerate(results['documents'][0]):
-                    metadata = results['metadatas'][0][i]
+            if results['documents'] and results['documents'][q]:
+                for i, doc in enumerate(results['documents'][q]):
+                    metadata = results['metadatas'][q][i]
                     product = self._metadata_to_product(metadata, doc)
                     products.append(product)
+            batches.append(products)
+        return batches
+
+    def _faiss_search(self, query_embeddings: np.ndarray, top_k: int, filters: Optional[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        # Over-fetch when filtering, then post-filter with the row mask
+        mask = self._build_numpy_mask(filters) if filters else None
+        k = min(top_k * 2 if filters else top_k, self._faiss_index.ntotal)
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        _, rows = self._faiss_index.search(query_embeddings, k)
+        batches = []
+        for q, query_rows in enumerate(rows):
+            products = []
+            for row in query_rows:
+                if row < 0 or (mask is not None and not mask[row]):
+                    continue
+                metadata, document = self._rows[row]
+                products.append(self._metadata_to_product(metadata, document))
+                if len(products) == top_k:
+                    break
+            if filters and len(products) < top_k:
+                # Selective filter starved the overfetch; score the masked rows exactly
+                products = self._bruteforce_search(query_embeddings[q:q + 1], top_k, filters)[0]
+            batches.append(products)
+        return batches
+
+    def _bruteforce_search(self, query_embeddings: np.ndarray, top_k: int, filters: Optional[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Exact search: one (N, dim) x (dim, rows) matmul plus the filter mask."""
+        scores = np.asarray(query_embeddings, dtype=np.float32) @ self._emb_matrix.T
+        candidates = scores.shape[1]
+        if filters:
+            mask = self._build_numpy_mask(filters)
+            scores[:, ~mask] = -np.inf
+            candidates = int(mask.sum())
+        k = min(top_k, candidates)
+        batches = []
+        for query_scores in scores:
+            if k <= 0:
+                batches.append([])
+                continue
+            top = np.argpartition(-query_scores, k - 1)[:k]
+            order = top[np.argsort(-query_scores[top])]
+            batches.append([self._metadata_to_product(*self._rows[row]) for row in order])
+        return batches
+
+    def _vector_search(self, query_embeddings, top_k: int, filters: Optional[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Run the ANN lookup for one or more query vectors on the active backend."""
+        if self._use_bruteforce:
+            return self._bruteforce_search(np.asarray(query_embeddings, dtype=np.float32), top_k, filters)
+        if self._faiss_index is not None:
+            return self._faiss_search(np.asarray(query_embeddings, dtype=np.float32), top_k, filters)
+        if isinstance(query_embeddings, np.ndarray):
+            query_embeddings = query_embeddings.tolist()
+        return self._chroma_search(query_embeddings, top_k, filters)
+
+    def _result_cache_key(self, query_norm: str, top_k: int, filters: Optional[Dict[str, Any]]) -> tuple:
+        return (
+            query_norm,
+            top_k,
+            json.dumps(filters, sort_keys=True, default=str) if filters else None
+        )
+
+    def search(self, query: str, top_k: int = 3, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Search products using semantic similarity with optional metadata filtering."""
+        try:
+            if top_k <= 0:
+                return []
+            query_norm = (query or "").strip().lower()
+            if not query_norm:
+                # Nothing to embed: answer from the filter mask alone
+                return self._filter_only_search(top_k, filters)
+            cache_key = self._result_cache_key(query_norm, top_k, filters)
+            if self._cache_enabled:
+                cached = self._cached_result(cache_key)
+                if cached is not None:
+                    logger.info(f"Result cache hit for query: '{query}'")
+                    return cached
+                query_embedding = self._emb_cache(query_norm)
+            else:
+                query_embedding = self._encode_uncached(query_norm)
+
+            products = self._vector_search([query_embedding], top_k, filters)[0]
             
+            if self._cache_enabled:
+                self._store_result(cache_key, products)
+
             logger.info(f"Found {len(products)} products for query: '{query}'")
             return products
             
@@ -186,8 +887,84 @@ class CatalogStore:
             logger.error(f"Search failed: {e}")
             return []
     
+    def _filter_only_search(self, top_k: int, filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """First ``top_k`` products matching ``filters``, in catalog order."""
+        order = self._catalog_order
+        rows = order[np.flatnonzero(self._build_numpy_mask(filters)[order])[:top_k]]
+        return [self._metadata_to_product(*self._rows[i]) for i in rows]
+
+    def query_vector(self, query: str) -> np.ndarray:
+        """Unit-norm embedding of ``query``, served from the query-embedding cache when enabled."""
+        query_norm = (query or "").strip().lower()
+        vec = self._emb_cache(query_norm) if self._cache_enabled else self._encode_uncached(query_norm)
+        return np.asarray(vec, dtype=np.float32)
+
+    def rerank(self, query_vec, candidate_ids: Optional[List[str]] = None, k: int = 3) -> List[Dict[str, Any]]:
+        """Exactly re-rank candidates by cosine similarity to ``query_vec``.
+
+        ``candidate_ids`` are product ids; when omitted the whole catalog is scored.
+        """
+        q = np.ascontiguousarray(np.asarray(query_vec, dtype=np.float32).ravel())
+        if candidate_ids is None:
+            rows = np.arange(len(self._rows))
+            mat = self._emb_matrix
+        else:
+            rows = np.array([self._row_index[c] for c in candidate_ids if c in self._row_index], dtype=np.int64)
+            mat = np.ascontiguousarray(self._emb_matrix[rows])
+        if k <= 0 or len(rows) == 0:
+            return []
+        order, _ = _cosine_topk(mat, q, min(k, len(rows)))
+        return [self._metadata_to_product(*self._rows[rows[i]]) for i in order]
+
+    def search_batch(self, queries: List[str], top_k: int = 3, filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """Search several queries with one encoder pass and one vector-store query.
+
+        Returns one product list per query, in input order.
+        """
+        try:
+            if top_k <= 0:
+                return [[] for _ in queries]
+            query_norms = [(q or "").strip().lower() for q in queries]
+            keys = [self._result_cache_key(q, top_k, filters) for q in query_norms]
+            batches: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+            if self._cache_enabled:
+                for i, key in enumerate(keys):
+                    cached = self._cached_result(key)
+                    if cached is not None:
+                        batches[i] = cached
+
+            for i, query_norm in enumerate(query_norms):
+                if batches[i] is None and not query_norm:
+                    batches[i] = self._filter_only_search(top_k, filters)
+
+            pending = [i for i, products in enumerate(batches) if products is None]
+            if pending:
+                with torch.inference_mode():
+                    embeddings = self.embedding_model.encode(
+                        [query_norms[i] for i in pending],
+                        batch_size=32,
+                        convert_to_numpy=True,
+                        normalize_embeddings=True
+                    )
+                for i, products in zip(pending, self._vector_search(embeddings, top_k, filters)):
+                    batches[i] = products
+                    if self._cache_enabled:
+                        self._store_result(keys[i], products)
+
+            logger.info(f"Batch search served {len(queries)} queries ({len(pending)} uncached)")
+            return batches
+            
+        except Exception as e:
+            logger.error(f"Batch search failed: {e}")
+            return [[] for _ in queries]
+    
     def get_all_products(self) -> List[Dict[str, Any]]:
-        """Get all products from the catalog for hybrid search."""
+        """Get all products from the catalog for hybrid search.
+
+        The list is built once and shared between calls; treat it as read-only.
+        """
+        if self._all_products_cache is not None:
+            return self._all_products_cache
         try:
             # Get all products from ChromaDB
             results = self.collection.get()
@@ -199,54 +976,22 @@ class CatalogStore:
                     product = self._metadata_to_product(metadata, document)
                     products.append(product)
             
+            self._all_products_cache = products
             logger.info(f"Retrieved {len(products)} products for hybrid search")
             return products
             
         except Exception as e:
             logger.error(f"Failed to get all products: {e}")
             return []
+
+    def iter_all_products(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over all products without building a new list."""
+        yield from self.get_all_products()
     
     def _build_filters(self, filters: Dict[str, Any]) -> Dict[str, Any]:
         """Build ChromaDB where clause for metadata filtering."""
         if not filters:
             return None
-            
-        # For ChromaDB, we need to use $and for multiple conditions
-        conditions = []
-        
-        # Price filtering
-        if 'price_max' in filters and 'price_min' in filters:
-            conditions.append({
-                '$and': [
-                    {'price': {'$gte': filters['price_min']}},
-                    {'price': {'$lte': filters['price_max']}}
-                ]
-            })
-        elif 'price_max' in filters:
-            conditions.append({'price': {'$lte': filters['price_max']}})
-        elif 'price_min' in filters:
-            conditions.append({'price': {'$gte': filters['price_min']}})
-        
-        # Color filtering
-        if 'color_family' in filters:
-            conditions.append({'color_family': {'$eq': filters['color_family']}})
-        
-        # Brand filtering
-        if 'brand' in filters:
-            conditions.append({'brand': {'$eq': filters['brand']}})
-        
-        # Category filtering
-        if 'category' in filters:
-            conditions.append({'category': {'$eq': filters['category']}})
-        
-        # Availability filtering
-        if 'availability' in filters:
-            conditions.append({'availability': {'$eq': filters['availability']}})
-        
-        # Combine all conditions
-        if len(conditions) == 1:
-            return conditions[0]
-        elif len(conditions) > 1:
-            return {'$and': conditions}
-        else:
-            return None
+
+        # Every subset of the known keys has a precompiled factory; unknown keys are ignored
+        return _FILTER_FACTORIES[frozenset(filters).intersection(_FILTER_KEYS)](filters)
@@ -3,18 +3,38 @@ Unified Gradio UI for Commerce Agent with proper conversational memory.
 Combines the best features from both UI files and fixes memory issues.
 """
 
+import asyncio
+import atexit
 import gradio as gr
+import httpx
 import requests
-import json
 import base64
+import functools
+import hashlib
 import io
+import itertools
 import os
+import sys
+import threading
+import time
+import orjson
 from PIL import Image
-from typing import List, Dict, Any, Tuple, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, AsyncIterator, Tuple, Optional
 from datetime import datetime
 
 from src.config import get_config, setup_logging
 
+# Optional SIMD base64 encoder for uploads; stdlib base64 is used otherwise
+try:
+    import pybase64  # type: ignore
+    _HAS_PYBASE64 = True
+except Exception:
+    pybase64 = None  # type: ignore
+    _HAS_PYBASE64 = False
+
 # Setup dynamic logging
 setup_logging()
 
@@ -22,16 +42,98 @@ setup_logging()
 config = get_config()
 API_BASE_URL = f"http://{config.api_host}:{config.api_port}"
 API_ENDPOINT = f"{API_BASE_URL}/api/v1/simple-rag/ask"
+API_STREAM_ENDPOINT = f"{API_BASE_URL}/api/v1/commerce-agent/ask-stream"
+API_BATCH_ENDPOINT = f"{API_BASE_URL}/api/v1/simple-rag/ask_batch"
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Seconds a chat turn may take end to end, including time queued for a batch
+REQUEST_TIMEOUT = 30.0
+
+# Seconds a health probe result is trusted before it is refreshed in the background
+HEALTH_TTL = 10.0
+
+# Minimum seconds between streamed chat re-renders (~10 Hz)
+STREAM_UPDATE_INTERVAL = 0.1
+
+# With ENABLE_BATCHING, turns arriving within this window (seconds) share one
+# /ask_batch call of at most BATCH_MAX_SIZE requests
+BATCH_WINDOW = 0.02
+BATCH_MAX_SIZE = 8
+
+# Chat handlers running at once across the send button and textbox submit,
+# and most events allowed to wait in Gradio's queue
+CHAT_CONCURRENCY = 8
+QUEUE_MAX_SIZE = 64
+
+# Encoded uploads kept per UI process, so a re-sent image skips resize + JPEG + base64
+IMAGE_CACHE_SIZE = 16
+
+# Conversation state machine: current state -> {intent: next state}
+_STATE_TRANSITIONS: Dict[str, Dict[str, str]] = {
+    "idle": {"product_search": "searching", "image_search": "analyzing", "general_chat": "chatting"},
+    "searching": {"product_search": "searching", "general_chat": "chatting", "image_search": "analyzing"},
+    "analyzing": {"image_search": "analyzing", "product_search": "searching", "general_chat": "chatting"},
+    "chatting": {"general_chat": "chatting", "product_search": "searching", "image_search": "analyzing"}
+}
+
+# Display order of the states in the memory panel
+_STATE_ORDER = ("idle", "searching", "analyzing", "chatting")
+
+# Longest rolling summary of evicted turns sent to the API
+SUMMARY_MAX_CHARS = 1000
+
+# Markdown card for one recommended product
+_CARD_TMPL = """
+**{i}. {display_name}** - ${price:.2f}
+- **Brand:** {brand}
+- **Color:** {color}
+- **Description:** {description}
+
+---
+"""
+
+# Response characters kept on turns older than the recent window
+AGED_RESPONSE_CHARS = 256
+
+
+@functools.lru_cache(maxsize=8)
+def _render_state_graph(state: str) -> str:
+    """State line for the memory panel with the current state highlighted."""
+    def fmt(s):
+        return f"<span style='padding:2px 8px;border-radius:10px;background:#2a3942;color:#e9edef'>{s}</span>" if s != state \
+            else f"<span style='padding:2px 8px;border-radius:10px;background:#00a884;color:#111b21;font-weight:700'>{s}</span>"
+    return " → ".join(fmt(s) for s in _STATE_ORDER)
+
+
+@functools.lru_cache(maxsize=64)
+def _render_interaction_line(intent: str, text: str) -> str:
+    """One recent-interaction row for the memory panel."""
+    text = text.strip().replace('\n', ' ')
+    if len(text) > 70:
+        text = text[:70] + '…'
+    badge = f"<span style='padding:2px 6px;border:1px solid #2a3942;border-radius:6px;color:#e9edef'>{intent}</span>"
+    return f"<div style='margin:6px 0'><span style='opacity:.85'>{badge}</span> <span style='color:#cfd8dc'>{text}</span></div>"
+
 
 class ConversationMemory:
     """Enhanced conversation memory with state tracking."""
     
     def __init__(self):
-        self.conversation_history = []
+        # Bounded: the oldest interaction is evicted in O(1) once the cap is reached
+        self.conversation_history = deque(maxlen=getattr(config, 'conversation_history_hard_cap', 200))
+        self._history_limit = getattr(config, 'conversation_context_limit', 5)
+        
+        # Recent turns are kept verbatim up to a character budget; older ones
+        # are folded into a compact one-line-per-turn summary
+        self.summary = ""
+        self.recent_budget_chars = getattr(config, 'conversation_recent_budget_chars', 4000)
+        self._recent_chars = 0
+        self.recent_turns = max(1, getattr(config, 'recent_turns', 3))
         self.current_state = "idle"
+        self.last_response_id: Optional[str] = None
         self.session_metadata = {
             "session_id": None,
-            "start_time": datetime.now().isoformat(),
+            "start_time_ns": time.time_ns(),
             "total_interactions": 0,
             "user_preferences": {},
             "product_interests": []
@@ -40,49 +142,92 @@ class ConversationMemory:
     def add_interaction(self, user_input: str, agent_response: str, image_data: Optional[str] = None, intent: str = "unknown"):
         """Add interaction to memory with state tracking."""
         interaction = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp_ns": time.time_ns(),
             "user_input": user_input,
             "agent_response": agent_response,
-            "image_data": image_data,
+            "image_ref": self._image_ref(image_data),
             "intent": intent,
             "state": self.current_state
         }
         
-        self.conversation_history.append(interaction)
+        history = self.conversation_history
+        if len(history) == history.maxlen:
+            self._fold_into_summary(history.popleft())
+        history.append(interaction)
+        self._recent_chars += self._turn_chars(interaction)
         self.session_metadata["total_interactions"] += 1
         
+        # Exactly one turn leaves the recent window per interaction; shrink it
+        # before the budget check so it is not folded away at full size
+        if len(history) > self.recent_turns:
+            self._age_interaction(history[-self.recent_turns - 1])
+        
+        # Only aged turns are folded; the recent window always stays verbatim
+        while self._recent_chars > self.recent_budget_chars and len(history) > self.recent_turns:
+            self._fold_into_summary(history.popleft())
+        
         # Update state based on intent
         self._update_state(intent)
     
+    @staticmethod
+    def _image_ref(image_data: Optional[str]) -> Optional[str]:
+        """Content hash recorded in place of the base64 image; the image itself is not kept."""
+        if not image_data:
+            return None
+        return hashlib.sha256(image_data.encode()).hexdigest()[:16]
+    
+    def _age_interaction(self, interaction: Dict[str, Any]):
+        """Shrink a turn that left the recent window, in place."""
+        response = interaction.get("agent_response") or ""
+        if len(response) > AGED_RESPONSE_CHARS:
+            interaction["agent_response"] = response[:AGED_RESPONSE_CHARS]
+            self._recent_chars -= len(response) - AGED_RESPONSE_CHARS
+        interaction["intent"] = sys.intern(interaction.get("intent") or "unknown")
+        interaction["state"] = sys.intern(interaction.get("state") or "idle")
+    
+    @staticmethod
+    def _turn_chars(interaction: Dict[str, Any]) -> int:
+        return len(interaction.get("user_input") or "") + len(interaction.get("agent_response") or "")
+    
+    def _fold_into_summary(self, interaction: Dict[str, Any]):
+        """Drop a turn from the verbatim window, keeping its intent and a short excerpt."""
+        self._recent_chars -= self._turn_chars(interaction)
+        text = (interaction.get("user_input") or "").strip().replace("\n", " ")
+        if len(text) > 80:
+            text = text[:80] + "…"
+        entry = f"{interaction.get('intent', 'unknown')}: {text}"
+        self.summary = f"{self.summary}; {entry}" if self.summary else entry
+        if len(self.summary) > SUMMARY_MAX_CHARS:
+            self.summary = "…" + self.summary[-SUMMARY_MAX_CHARS:]
+    
     def _update_state(self, intent: str):
         """Update conversation state based on intent."""
-        state_transitions = {
-            "idle": {"product_search": "searching", "image_search": "analyzing", "general_chat": "chatting"},
-            "searching": {"product_search": "searching", "general_chat": "chatting", "image_search": "analyzing"},
-            "analyzing": {"image_search": "analyzing", "product_search": "searching", "general_chat": "chatting"},
-            "chatting": {"general_chat": "chatting", "product_search": "searching", "image_search": "analyzing"}
-        }
-        
-        if intent in state_transitions.get(self.current_state, {}):
-            self.current_state = state_transitions[self.current_state][intent]
+        next_state = _STATE_TRANSITIONS.get(self.current_state, {}).get(intent)
+        if next_state is not None:
+            self.current_state = next_state
     
     def get_context_for_api(self) -> Dict[str, Any]:
         """Get conversation context for API requests."""
-        # Get configurable conversation history limit
-        history_limit = getattr(config, 'conversation_context_limit', 5)
+        # Only the configured tail of the ring buffer is materialized; orjson
+        # serializes the tuple directly
+        size = len(self.conversation_history)
         return {
-            "conversation_history": self.conversation_history[-history_limit:],
+            "summary": self.summary,
+            "conversation_history": tuple(itertools.islice(self.conversation_history, max(0, size - self._history_limit), size)),
             "current_state": self.current_state,
             "session_metadata": self.session_metadata
         }
     
     def clear_memory(self):
         """Clear conversation memory."""
-        self.conversation_history = []
+        self.conversation_history.clear()
+        self.summary = ""
+        self._recent_chars = 0
         self.current_state = "idle"
+        self.last_response_id = None
         self.session_metadata = {
             "session_id": None,
-            "start_time": datetime.now().isoformat(),
+            "start_time_ns": time.time_ns(),
             "total_interactions": 0,
             "user_preferences": {},
             "product_interests": []
@@ -92,40 +237,141 @@ class UnifiedCommerceUI:
     """Unified Gradio interface for the Commerce Agent with proper memory."""
     
     def __init__(self):
-        self.conversation_memory = ConversationMemory()
-        self.api_available = self._check_api_health()
+        self.session = self._create_session()
+        self.aclient = self._create_async_client()
+        atexit.register(self._close_async_client)
+        self._img_cache: "OrderedDict[bytes, str]" = OrderedDict()
+        self._img_cache_lock = threading.Lock()
         self.config = config
+        
+        # Non-streaming turns waiting for the batcher: (future, pre-encoded body)
+        self._pending: List[Tuple[asyncio.Future, bytes]] = []
+        self._batcher: Optional[asyncio.Task] = None
+        # In-flight batch sends; the loop only keeps weak references to tasks
+        self._batch_tasks: set = set()
+        
+        # Health is probed off the startup path and re-probed once stale
+        self._api_available = False
+        self._api_available_ts = 0.0
+        self._health_lock = threading.Lock()
+        self._health_refreshing = False
+        self._start_health_probe()
+    
+    @staticmethod
+    def _create_session() -> requests.Session:
+        """Keep-alive connection pool shared by every API call from this UI."""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+    
+    @staticmethod
+    def _create_async_client() -> httpx.AsyncClient:
+        """Async keep-alive client for chat turns; frees Gradio's worker while waiting on the API."""
+        return httpx.AsyncClient(
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+            transport=httpx.AsyncHTTPTransport(retries=2)
+        )
+    
+    def _close_async_client(self):
+        try:
+            asyncio.run(self.aclient.aclose())
+        except Exception:
+            pass
+    
+    @property
+    def api_available(self) -> bool:
+        """Last known API health; a background re-probe starts once it is older than HEALTH_TTL."""
+        if time.monotonic() - self._api_available_ts > HEALTH_TTL:
+            self._start_health_probe()
+        return self._api_available
+    
+    def _start_health_probe(self):
+        """Probe health in a background thread unless one is already running."""
+        with self._health_lock:
+            if self._health_refreshing:
+                return
+            self._health_refreshing = True
+        threading.Thread(target=self._background_health_probe, daemon=True).start()
+    
+    def _background_health_probe(self):
+        try:
+            self._refresh_health()
+        finally:
+            # Only the probe thread that set the flag clears it
+            with self._health_lock:
+                self._health_refreshing = False
+    
+    def _refresh_health(self) -> bool:
+        """Probe health now (blocking) and record the result."""
+        self._api_available = self._check_api_health()
+        self._api_available_ts = time.monotonic()
+        return self._api_available
     
     def _check_api_health(self) -> bool:
         """Check if the API is running and accessible."""
         try:
-            response = requests.get(f"{API_BASE_URL}/health", timeout=5)
+            response = self.session.get(f"{API_BASE_URL}/health", timeout=1)
             return response.status_code == 200
         except:
             return False
     
+    @staticmethod
+    def _image_key(image) -> bytes:
+        """Truncated SHA-256 of the image pixels, mode and size."""
+        digest = hashlib.sha256(f"{image.mode}:{image.size}".encode())
+        digest.update(image.tobytes())
+        return digest.digest()[:16]
+    
     def _process_image(self, image) -> Optional[str]:
         """Convert PIL image to base64 string."""
         if image is None:
             return None
         
         try:
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
+            max_size = 1024
+            
+            # Let libjpeg decode large JPEGs at 1/2, 1/4 or 1/8 scale instead of full resolution;
+            # only possible while the upload is still an undecoded JPEG file
+            if getattr(image, 'format', None) == 'JPEG' and max(image.size) > max_size:
+                image.draft('RGB', (max_size, max_size))
+                image.load()
+            
+            key = self._image_key(image)
+            with self._img_cache_lock:
+                cached = self._img_cache.get(key)
+                if cached is not None:
+                    self._img_cache.move_to_end(key)
+                    return cached
+            
+            # Palette and bilevel images only resize with NEAREST, so expand them first
+            if image.mode in ('P', '1'):
                 image = image.convert('RGB')
             
-            # Resize if too large (max 1024px on longest side)
-            max_size = 1024
-            if max(image.size) > max_size:
-                ratio = max_size / max(image.size)
-                new_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
+            # Shrink in place (max 1024px on longest side), then convert the smaller image
+            image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
             
             # Convert to base64
             buffer = io.BytesIO()
-            image.save(buffer, format='JPEG', quality=85)
+            image.save(buffer, format='JPEG', quality=80, optimize=False, progressive=False, subsampling=2)
             img_bytes = buffer.getvalue()
-            img_base64 = base64.b64encode(img_bytes).decode('utf-8')
+            if _HAS_PYBASE64:
+                img_base64 = pybase64.b64encode_as_string(img_bytes)
+            else:
+                img_base64 = base64.b64encode(img_bytes).decode('utf-8')
+            
+            with self._img_cache_lock:
+                self._img_cache[key] = img_base64
+                if len(self._img_cache) > IMAGE_CACHE_SIZE:
+                    self._img_cache.popitem(last=False)
             
             return img_base64
             
@@ -138,78 +384,192 @@ class UnifiedCommerceUI:
         if not products:
             return agent_response
         
-        # Create product cards using markdown format
-        product_cards = []
-        for i, product in enumerate(products[:5], 1):  # Limit to 5 products for display
-            name = product.get('name', 'Unknown Product')
-            price = product.get('price', 0)
-            brand = product.get('attributes', {}).get('brand', 'Unknown Brand')
-            color = product.get('attributes', {}).get('color_family', 'Unknown Color')
-            description = product.get('description', '')
-            url = product.get('url', '')
-            
-            # Truncate description if too long
-            if len(description) > 100:
-                description = description[:100] + '...'
-            
-            display_name = f"[{name}]({url})" if url else name
-            product_card = f"""
-**{i}. {display_name}** - ${price:.2f}
-- **Brand:** {brand}
-- **Color:** {color}
-- **Description:** {description}
-
----
-"""
-            product_cards.append(product_card)
+        # Create product cards using markdown format (limit to 5 products for display)
+        product_cards = ''.join(
+            self._format_product_card(i, product) for i, product in enumerate(products[:5], 1)
+        )
         
         return agent_response + f"""
 
 🛍️ **Recommended Products:**
 
-{''.join(product_cards)}
+{product_cards}
 """
     
-    def chat_with_agent(self, message: str, image: Optional[Image.Image], history: List) -> Tuple[str, List, Optional[Image.Image]]:
-        """Process chat message with proper conversation memory."""
-        if not self.api_available:
-            return "❌ **API Error**: The commerce agent API is not available. Please make sure the server is running on port 8080.", history, None
+    @staticmethod
+    def _format_product_card(i: int, product: Dict[str, Any]) -> str:
+        """Render one product with the shared card template."""
+        attributes = product.get('attributes') or {}
+        name = product.get('name', 'Unknown Product')
+        url = product.get('url', '')
+        description = product.get('description', '')
+        return _CARD_TMPL.format(
+            i=i,
+            display_name=f"[{name}]({url})" if url else name,
+            price=product.get('price', 0),
+            brand=attributes.get('brand', 'Unknown Brand'),
+            color=attributes.get('color_family', 'Unknown Color'),
+            # Truncate description if too long
+            description=description[:100] + '...' if len(description) > 100 else description
+        )
+    
+    async def _relay_stream(self, response: httpx.Response, history: List, result: Dict[str, Any]) -> AsyncIterator[Tuple[str, List, Optional[Image.Image]]]:
+        """Render SSE events into the last chat row, collecting the final payload into ``result``."""
+        last_yield = 0.0
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = orjson.loads(line[6:])
+            kind = event.get('type')
+            if kind == 'error':
+                raise RuntimeError(event.get('message', 'Streaming failed'))
+            if kind == 'status':
+                history[-1][1] = f"⏳ *{event.get('message', '')}*"
+            elif kind == 'response':
+                result.update(event)
+                history[-1][1] = self._format_response_with_products(
+                    event.get('response', ''), event.get('products', [])
+                )
+            else:
+                continue
+            
+            # Throttle re-renders so the websocket is not flooded with updates
+            now = time.monotonic()
+            if now - last_yield >= STREAM_UPDATE_INTERVAL:
+                last_yield = now
+                yield "", history, None
+    
+    async def _ask(self, body: bytes) -> Tuple[int, Any]:
+        """POST one turn to the ask endpoint; returns (status, parsed result or error text)."""
+        if not self.config.enable_batching:
+            return await self._post_single(body)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((future, body))
+        if self._batcher is None or self._batcher.done():
+            self._batcher = asyncio.create_task(self._run_batcher())
+        try:
+            return await asyncio.wait_for(future, REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise httpx.ReadTimeout("Timed out waiting for the batched API response")
+    
+    async def _post_single(self, body: bytes) -> Tuple[int, Any]:
+        response = await self.aclient.post(API_ENDPOINT, content=body, headers=JSON_HEADERS)
+        if response.status_code != 200:
+            return response.status_code, response.text
+        return 200, orjson.loads(response.content)
+    
+    async def _run_batcher(self):
+        """Drain pending turns every BATCH_WINDOW until none are left."""
+        while self._pending:
+            await asyncio.sleep(BATCH_WINDOW)
+            batch = self._pending[:BATCH_MAX_SIZE]
+            del self._pending[:BATCH_MAX_SIZE]
+            task = asyncio.create_task(self._send_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+    
+    async def _send_batch(self, batch: List[Tuple[asyncio.Future, bytes]]):
+        try:
+            if len(batch) == 1:
+                # A lone turn goes straight to /ask rather than paying for batch framing
+                outcomes = [await self._post_single(batch[0][1])]
+            else:
+                # Items are already JSON; splice them into the envelope without re-encoding
+                body = b'{"requests":[' + b",".join(item for _, item in batch) + b"]}"
+                response = await self.aclient.post(API_BATCH_ENDPOINT, content=body, headers=JSON_HEADERS)
+                if response.status_code != 200:
+                    outcomes = [(response.status_code, response.text)] * len(batch)
+                else:
+                    items = orjson.loads(response.content)
+                    if not isinstance(items, list) or len(items) != len(batch):
+                        raise ValueError(f"Batch response has {len(items) if isinstance(items, list) else 'no'} items for {len(batch)} requests")
+                    outcomes = [
+                        (item['status_code'], item['error']) if 'error' in item else (200, item)
+                        for item in items
+                    ]
+            for (future, _), outcome in zip(batch, outcomes):
+                if not future.done():
+                    future.set_result(outcome)
+        except Exception as e:
+            # Never leave a waiting turn without an outcome
+            for future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+    
+    async def chat_with_agent(self, message: str, image: Optional[Image.Image], history: List, memory: Optional[ConversationMemory]) -> AsyncIterator[Tuple[str, List, Optional[Image.Image], ConversationMemory]]:
+        """Process chat message with the session's conversation memory.
+        
+        Yields UI updates ending with the (mutated) memory so Gradio keeps it in
+        the session state; with ENABLE_STREAMING the reply is read from the SSE
+        endpoint and the chat row is re-rendered as events arrive.
+        """
+        if memory is None:
+            memory = ConversationMemory()
+        
+        # A stale "down" result gets one synchronous re-probe before refusing the turn
+        if not self.api_available and not await asyncio.to_thread(self._refresh_health):
+            yield "❌ **API Error**: The commerce agent API is not available. Please make sure the server is running on port 8080.", history, None, memory
+            return
         
         if not message.strip() and image is None:
-            return "Please enter a message or upload an image.", history, None
+            yield "Please enter a message or upload an image.", history, None, memory
+            return
         
+        streaming = self.config.enable_streaming
+        row_open = False
         try:
-            # Process image if provided
-            image_base64 = self._process_image(image)
+            # Process image if provided (PIL work stays off the event loop)
+            image_base64 = await asyncio.to_thread(self._process_image, image)
             
-            # Get conversation context from memory
-            conversation_context = self.conversation_memory.get_context_for_api()
+            # Get conversation context from memory, serialized once for both the
+            # context hash and the request body
+            context_json = orjson.dumps(memory.get_context_for_api())
             
-            # Prepare request data with conversation context
+            # Prepare request data with conversation context; the previous response id
+            # and context hash let the backend recognise an unchanged conversation
             request_data = {
                 "text_input": message.strip() if message else None,
                 "image_base64": image_base64,
-                "conversation_context": conversation_context  # This is the key fix!
+                "conversation_context": orjson.Fragment(context_json),  # This is the key fix!
+                "previous_response_id": memory.last_response_id,
+                "context_hash": hashlib.sha256(context_json).hexdigest()[:16]
             }
+            body = orjson.dumps(request_data)
             
-            # Make API request
-            response = requests.post(API_ENDPOINT, json=request_data, timeout=30)
-            
-            if response.status_code != 200:
-                return f"❌ **API Error**: {response.status_code} - {response.text}", history, None
+            # Make API request (body pre-encoded with orjson over the pooled async client)
+            result: Dict[str, Any] = {}
+            if streaming:
+                # Show the user's turn right away; the reply fills in as it streams
+                history.append([message, "⏳ *Thinking...*"])
+                row_open = True
+                yield "", history, None, memory
+                async with self.aclient.stream("POST", API_STREAM_ENDPOINT, content=body, headers=JSON_HEADERS) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        history.pop()
+                        yield f"❌ **API Error**: {response.status_code} - {response.text}", history, None, memory
+                        return
+                    async for update in self._relay_stream(response, history, result):
+                        yield (*update, memory)
+            else:
+                # Coalesced with concurrent sessions' turns when ENABLE_BATCHING is on
+                status_code, result = await self._ask(body)
+                
+                if status_code != 200:
+                    yield f"❌ **API Error**: {status_code} - {result}", history, None, memory
+                    return
             
-            # Parse response
-            result = response.json()
             agent_response = result.get('response', 'No response received')
             products = result.get('products', [])
             intent = result.get('intent', 'unknown')
             confidence = result.get('confidence', 0.0)
+            memory.last_response_id = result.get('response_id')
             
             # Format response with products
             formatted_response = self._format_response_with_products(agent_response, products)
             
             # Add interaction to memory
-            self.conversation_memory.add_interaction(
+            memory.add_interaction(
                 user_input=message,
                 agent_response=agent_response,
                 image_data=image_base64,
@@ -217,23 +577,37 @@ class UnifiedCommerceUI:
             )
             
             # Update conversation history for UI
-            history.append([message, formatted_response])
+            if row_open:
+                history[-1][1] = formatted_response
+            else:
+                history.append([message, formatted_response])
             
-            return "", history, None
+            yield "", history, None, memory
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             error_msg = f"❌ **Connection Error**: Unable to connect to the API. Please check if the server is running.\n\nError: {str(e)}"
-            history.append([message, error_msg])
-            return "", history, None
+            if row_open:
+                history[-1][1] = error_msg
+            else:
+                history.append([message, error_msg])
+            yield "", history, None, memory
         except Exception as e:
             error_msg = f"❌ **Unexpected Error**: {str(e)}"
-            history.append([message, error_msg])
-            return "", history, None
+            if row_open:
+                history[-1][1] = error_msg
+            else:
+                history.append([message, error_msg])
+            yield "", history, None, memory
+    
+    def clear_chat(self) -> Tuple[str, List, ConversationMemory]:
+        """Clear the conversation history and start a fresh session memory."""
+        return "", [], ConversationMemory()
     
-    def clear_chat(self) -> Tuple[str, List]:
-        """Clear the conversation history and memory."""
-        self.conversation_memory.clear_memory()
-        return "", []
+    def _footer_markdown(self) -> str:
+        return f"""
+            ---
+            **Powered by**: {self.config.llm_model} | **Memory**: ✅ Enabled | **API**: {'🟢 Connected' if self.api_available else '🔴 Disconnected'}
+            """
     
     def create_interface(self):
         """Create the unified Gradio interface with proper memory management."""
@@ -311,8 +685,11 @@ class UnifiedCommerceUI:
                         send_btn = gr.Button("Send", variant="primary", scale=1)
 
                     # Image upload (full-width, clearly visible)
+                    # image_mode=None skips Gradio's convert("RGB"), so uploads arrive as
+                    # lazily opened files and _process_image can draft-decode JPEGs
                     image_input = gr.Image(
                         type="pil",
+                        image_mode=None,
                         sources=["upload", "clipboard", "webcam"],
                         label="Upload Image (Optional)",
                         height=240,
@@ -329,36 +706,34 @@ class UnifiedCommerceUI:
                 with gr.Column():
                     memory_info = gr.Markdown("Memory information will appear here...")
             
+            # Conversation memory is per browser session; each page load gets its own
+            memory_state = gr.State()
+            interface.load(lambda: ConversationMemory(), outputs=[memory_state])
+            
             # Event handlers
-            def handle_send(message, image, history):
-                return self.chat_with_agent(message, image, history)
+            async def handle_send(message, image, history, memory):
+                async for update in self.chat_with_agent(message, image, history, memory):
+                    yield update
             
             def handle_clear():
                 return self.clear_chat()
             
-            def show_memory_info():
-                ctx = self.conversation_memory.get_context_for_api()
+            def show_memory_info(memory):
+                ctx = (memory or ConversationMemory()).get_context_for_api()
                 state = (ctx.get('current_state') or 'idle').lower()
                 meta = ctx.get('session_metadata', {})
                 history = ctx.get('conversation_history', [])
 
-                # Build compact state line with highlighted current state
-                state_order = ["idle", "searching", "analyzing", "chatting"]
-                def fmt(s):
-                    return f"<span style='padding:2px 8px;border-radius:10px;background:#2a3942;color:#e9edef'>{s}</span>" if s != state \
-                        else f"<span style='padding:2px 8px;border-radius:10px;background:#00a884;color:#111b21;font-weight:700'>{s}</span>"
-                state_graph = " → ".join(fmt(s) for s in state_order)
-
-                # Build recent interactions (most recent first, max 5)
-                lines = []
-                recent = history[-5:][::-1]
-                for it in recent:
-                    intent = it.get('intent', 'unknown')
-                    text = (it.get('user_input') or '').strip().replace('\n', ' ')
-                    if len(text) > 70:
-                        text = text[:70] + '…'
-                    badge = f"<span style='padding:2px 6px;border:1px solid #2a3942;border-radius:6px;color:#e9edef'>{intent}</span>"
-                    lines.append(f"<div style='margin:6px 0'><span style='opacity:.85'>{badge}</span> <span style='color:#cfd8dc'>{text}</span></div>")
+                state_graph = _render_state_graph(state)
+                # Timestamps are kept as epoch ns and only formatted here
+                start_ns = meta.get('start_time_ns')
+                started = datetime.fromtimestamp(start_ns / 1e9).isoformat(timespec='seconds') if start_ns else ''
+
+                # Recent interactions (most recent first, max 5)
+                lines = [
+                    _render_interaction_line(it.get('intent', 'unknown'), it.get('user_input') or '')
+                    for it in history[-5:][::-1]
+                ]
 
                 recent_html = "".join(lines) if lines else "<div style='opacity:.7'>No prior interactions.</div>"
 
@@ -369,7 +744,7 @@ class UnifiedCommerceUI:
   <div style='margin-bottom:6px'>State: {state_graph}</div>
   <div style='margin-bottom:12px;color:#cfd8dc'>
     <span style='margin-right:12px'>Checkpoints: <b>{meta.get('total_interactions',0)}</b></span>
-    <span>Started: {meta.get('start_time','')}</span>
+    <span>Started: {started}</span>
   </div>
   <div style='margin:6px 0;font-weight:600'>Recent</div>
   {recent_html}
@@ -378,37 +753,45 @@ class UnifiedCommerceUI:
                 return html
             
             # Connect event handlers
+            # Both chat triggers share one "chat" slot pool
             send_btn.click(
                 handle_send,
-                inputs=[msg_input, image_input, chatbot],
-                outputs=[msg_input, chatbot, image_input]
+                inputs=[msg_input, image_input, chatbot, memory_state],
+                outputs=[msg_input, chatbot, image_input, memory_state],
+                concurrency_limit=CHAT_CONCURRENCY,
+                concurrency_id="chat",
+                show_progress="minimal"
             )
             
             msg_input.submit(
                 handle_send,
-                inputs=[msg_input, image_input, chatbot],
-                outputs=[msg_input, chatbot, image_input]
+                inputs=[msg_input, image_input, chatbot, memory_state],
+                outputs=[msg_input, chatbot, image_input, memory_state],
+                concurrency_limit=CHAT_CONCURRENCY,
+                concurrency_id="chat",
+                show_progress="minimal"
             )
             
             clear_btn.click(
                 handle_clear,
-                outputs=[msg_input, chatbot]
+                outputs=[msg_input, chatbot, memory_state]
             )
             
             memory_info_btn.click(
                 show_memory_info,
-                outputs=[memory_info]
+                inputs=[memory_state],
+                outputs=[memory_info],
+                concurrency_limit=None
             ).then(
                 lambda: gr.Row(visible=True),
                 outputs=[memory_panel]
             )
             
-            # Footer
-            gr.Markdown(f"""
-            ---
-            **Powered by**: {self.config.llm_model} | **Memory**: ✅ Enabled | **API**: {'🟢 Connected' if self.api_available else '🔴 Disconnected'}
-            """)
+            # Footer (re-rendered on every page load with the latest health state)
+            footer = gr.Markdown(self._footer_markdown())
+            interface.load(self._footer_markdown, outputs=[footer])
         
+        interface.queue(default_concurrency_limit=CHAT_CONCURRENCY, max_size=QUEUE_MAX_SIZE, status_update_rate=0.5)
         return interface
 
 def main():